@@ -23,7 +23,9 @@ import os.path
 import re
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 import onnx
+from onnx import numpy_helper
 
 # TensorRT
 import tensorrt as trt
@@ -43,8 +45,11 @@ emln_plg_creator = plg_registry.get_plugin_creator("CustomEmbLayerNormPluginDyna
 qkv2_plg_creator = plg_registry.get_plugin_creator("CustomQKVToContextPluginDynamic", "1", "")
 skln_plg_creator = plg_registry.get_plugin_creator("CustomSkipLayerNormPluginDynamic", "1", "")
 fc_plg_creator = plg_registry.get_plugin_creator("CustomFCPluginDynamic", "1", "")
+gelu_plg_creator = plg_registry.get_plugin_creator("CustomGeluPluginDynamic", "1", "")
 
 _global_submodel_id = 0
+# first integer in a parameter name, i.e. the layer (or sub-model) index
+_LAYER_RE = re.compile(r"\d+")
 """
 Attentions Keys
 """
@@ -93,7 +98,7 @@ def get_tensor_info(model_id, tensor_name, tensor_value):
     model_id = str(model_id)
     # classifier
     if tensor_name.startswith('classifier'):
-        return f"{model_id}_classifier", tensor_name.replace('.', '/'), tensor_value
+        return f"{model_id}_classifier", tensor_name.replace('.', '/'), tensor_value.numpy()
     tensor_name = "/".join(tensor_name.split('.')[1:])
     if tensor_name.startswith('embeddings'):
         embedding_map = {
@@ -104,20 +109,20 @@ def get_tensor_info(model_id, tensor_name, tensor_value):
             "embeddings/LayerNorm/bias": "embeddings/LayerNorm/beta"
         }
         new_tensor_name = embedding_map[tensor_name]
-        new_tensor_value = tensor_value
+        new_tensor_value = tensor_value.numpy()
     elif tensor_name.startswith('encoder'):
-        new_tensor_value = tensor_value
+        new_tensor_value = tensor_value.numpy()
         # layer
         new_tensor_name = tensor_name.replace('layer/', 'layer_')
         # layernorm
         new_tensor_name = new_tensor_name.replace('LayerNorm/weight', 'LayerNorm/gamma').replace('LayerNorm/bias',
                                                                                           'LayerNorm/beta')
+        # kernels keep the pytorch (out, in) layout, which is already KCRS for the 1x1 convolutions
         if 'weight' in new_tensor_name:
-            new_tensor_value = np.transpose(new_tensor_value)
             new_tensor_name = new_tensor_name.replace('weight', 'kernel')
     elif tensor_name.startswith('pooler'):
         new_tensor_name = tensor_name
-        new_tensor_value = tensor_value
+        new_tensor_value = tensor_value.numpy()
     new_tensor_name = 'bert/' + new_tensor_name
     return model_id, new_tensor_name, new_tensor_value
 
@@ -130,7 +135,6 @@ def get_tf_tensor_dict(model_names):
     for model_id, model_name in enumerate(model_names):
         for k, v in torch.load(os.path.join(model_name, 'pytorch_model.bin'),
                                map_location='cpu').items():
-            v = v.numpy()
             try:
                 param_type, new_name, new_value = get_tensor_info(model_id, k, v)
             except Exception as e:
@@ -157,6 +161,12 @@ class BertConfig:
         self.use_int8_multihead = use_int8_multihead
         self.is_calib_mode = False
         self.use_qat = use_qat
+        # INT32 plugin fields are identical across layers, see get_int_plugin_field
+        self._int_plugin_fields = {}
+        # skip layernorm weight fields, reused when the engine is rebuilt after calibration
+        self._weights_plugin_fields = {}
+        # QKV2CTX plugin field collections without QAT scales, keyed by (hidden_size, num_heads, has_mask, type_id)
+        self._qkv2ctx_pfcs = {}
 
 
 def set_tensor_name(tensor, prefix, name):
@@ -171,6 +181,36 @@ def set_output_name(layer, prefix, name, out_idx=0):
 def set_output_range(layer, maxval, out_idx=0):
     layer.get_output(out_idx).set_dynamic_range(-maxval, maxval)
 
+def get_int_plugin_field(config, name, value):
+    """
+    Get a cached scalar INT32 plugin field, keyed by value since the plugin dtypes change in calibration mode
+    """
+    value = int(value)
+    key = (name, value)
+    field = config._int_plugin_fields.get(key)
+    if field is None:
+        field = trt.PluginField(name, np.array([value], np.int32), trt.PluginFieldType.INT32)
+        config._int_plugin_fields[key] = field
+    return field
+
+def get_weights_plugin_field(config, name, weights, use_fp16=False):
+    """
+    Get a cached FLOAT32 (or FLOAT16 if use_fp16) plugin field holding the values of weights
+    """
+    key = (name, id(weights), use_fp16)
+    cached = config._weights_plugin_fields.get(key)
+    if cached is None:
+        if use_fp16:
+            data = weights.numpy().astype(np.float16)
+            field = trt.PluginField(name, data, trt.PluginFieldType.FLOAT16)
+        else:
+            data = weights.numpy()
+            field = trt.PluginField(name, data, trt.PluginFieldType.FLOAT32)
+        # keep weights referenced so that its id stays unique while cached, and data alive for the field
+        cached = (weights, data, field)
+        config._weights_plugin_fields[key] = cached
+    return cached[2]
+
 def get_mha_dtype(config):
     dtype = trt.float32
     if config.use_fp16:
@@ -210,18 +250,24 @@ def attention_layer_opt(prefix, config, init_dict, network, input_tensor, imask)
     has_mask = imask is not None
 
     # QKV2CTX
-    pf_type = trt.PluginField("type_id", np.array([get_mha_dtype(config)], np.int32), trt.PluginFieldType.INT32)
+    mha_dtype = get_mha_dtype(config)
+    pf_type = get_int_plugin_field(config, "type_id", mha_dtype)
 
-    pf_hidden_size = trt.PluginField("hidden_size", np.array([hidden_size], np.int32), trt.PluginFieldType.INT32)
-    pf_num_heads = trt.PluginField("num_heads", np.array([num_heads], np.int32), trt.PluginFieldType.INT32)
-    pf_has_mask = trt.PluginField("has_mask", np.array([has_mask], np.int32), trt.PluginFieldType.INT32)
+    pf_hidden_size = get_int_plugin_field(config, "hidden_size", hidden_size)
+    pf_num_heads = get_int_plugin_field(config, "num_heads", num_heads)
+    pf_has_mask = get_int_plugin_field(config, "has_mask", has_mask)
     if config.use_qat:
-        dr_probs = init_dict[prefix + 'self_av_a_input_quantizer_amax']
+        # the QKV2CTX plugin takes a single probs scale, per-head amax vectors are reduced to their max
+        dr_probs = float(np.max(init_dict[prefix + 'self_av_a_input_quantizer_amax']))
         dq_probs = dr_probs / 127.0
         pf_dq_probs = trt.PluginField("dq_probs", np.array([dq_probs], np.float32), trt.PluginFieldType.FLOAT32)
         pfc = trt.PluginFieldCollection([pf_hidden_size, pf_num_heads, pf_has_mask, pf_type, pf_dq_probs])
     else:
-        pfc = trt.PluginFieldCollection([pf_hidden_size, pf_num_heads, pf_has_mask, pf_type])
+        pfc_key = (hidden_size, num_heads, has_mask, mha_dtype)
+        pfc = config._qkv2ctx_pfcs.get(pfc_key)
+        if pfc is None:
+            pfc = trt.PluginFieldCollection([pf_hidden_size, pf_num_heads, pf_has_mask, pf_type])
+            config._qkv2ctx_pfcs[pfc_key] = pfc
     qkv2ctx_plug = qkv2_plg_creator.create_plugin("qkv2ctx", pfc)
 
     qkv_in = [mult_all.get_output(0)]
@@ -251,17 +297,17 @@ def skipln(prefix, config, init_dict, network, input_tensor, skip, bias=None):
     if config.use_int8 and config.use_int8_skipln and not config.is_calib_mode:
         dtype = trt.int8
 
-    pf_ld = trt.PluginField("ld", np.array([hidden_size], np.int32), trt.PluginFieldType.INT32)
-    wbeta = init_dict[prefix + "beta"]
-    pf_beta = trt.PluginField("beta", wbeta.numpy(), trt.PluginFieldType.FLOAT32)
-    wgamma = init_dict[prefix + "gamma"]
-    pf_gamma = trt.PluginField("gamma", wgamma.numpy(), trt.PluginFieldType.FLOAT32)
-    pf_type = trt.PluginField("type_id", np.array([int(dtype)], np.int32), trt.PluginFieldType.INT32)
+    pf_ld = get_int_plugin_field(config, "ld", hidden_size)
+    # the plugin converts its weights to the compute type, FP16/INT8 kernels keep them in FP16
+    fp16_params = dtype != trt.float32
+    pf_beta = get_weights_plugin_field(config, "beta", init_dict[prefix + "beta"], fp16_params)
+    pf_gamma = get_weights_plugin_field(config, "gamma", init_dict[prefix + "gamma"], fp16_params)
+    pf_type = get_int_plugin_field(config, "type_id", dtype)
 
     fields = [pf_ld, pf_beta, pf_gamma, pf_type]
 
     if bias:
-        pf_bias = trt.PluginField("bias", bias.numpy(), trt.PluginFieldType.FLOAT32)
+        pf_bias = get_weights_plugin_field(config, "bias", bias, fp16_params)
         fields.append(pf_bias)
 
     pfc = trt.PluginFieldCollection(fields)
@@ -273,9 +319,11 @@ def skipln(prefix, config, init_dict, network, input_tensor, skip, bias=None):
 
 
 def custom_fc(config, network, input_tensor, out_dims, W):
-    pf_out_dims = trt.PluginField("out_dims", np.array([out_dims], dtype=np.int32), trt.PluginFieldType.INT32)
-    pf_W = trt.PluginField("W", W.numpy(), trt.PluginFieldType.FLOAT32)
-    pf_type = trt.PluginField("type_id", np.array([1 if config.use_fp16 else 0], np.int32), trt.PluginFieldType.INT32)
+    # kernels are stored once as (out_dims, in_dims) for the conv/FC layers, the FC plugin expects them transposed
+    W_notrans = np.ascontiguousarray(W.numpy().reshape((out_dims, -1)).T)
+    pf_out_dims = get_int_plugin_field(config, "out_dims", out_dims)
+    pf_W = trt.PluginField("W", W_notrans, trt.PluginFieldType.FLOAT32)
+    pf_type = get_int_plugin_field(config, "type_id", 1 if config.use_fp16 else 0)
     pfc = trt.PluginFieldCollection([pf_out_dims, pf_W, pf_type])
     fc_plugin = fc_plg_creator.create_plugin("fcplugin", pfc)
     plug_inputs = [input_tensor]
@@ -283,6 +331,16 @@ def custom_fc(config, network, input_tensor, out_dims, W):
     return out_dense
 
 
+def add_gelu(config, network, input_tensor):
+    """
+    Add the GELU plugin on the FC1 output, it only implements FP32 and FP16
+    """
+    pf_type = get_int_plugin_field(config, "type_id", 1 if config.use_fp16 else 0)
+    pfc = trt.PluginFieldCollection([pf_type])
+    gelu_plug = gelu_plg_creator.create_plugin("gelu", pfc)
+    return network.add_plugin_v2([input_tensor], gelu_plug)
+
+
 def transformer_layer_opt(prefix, config, init_dict, network, input_tensor, imask):
     """
     Add the transformer layer
@@ -292,18 +350,25 @@ def transformer_layer_opt(prefix, config, init_dict, network, input_tensor, imas
     hidden_size = idims[2]
 
     if config.use_qat:
-        dr_input = init_dict[prefix + 'attention_self_query_input_amax']
-        assert (dr_input == init_dict[prefix + 'attention_self_key_input_amax'])
-        assert (dr_input == init_dict[prefix + 'attention_self_value_input_amax'])
-        input_tensor.set_dynamic_range(-dr_input, dr_input)
+        # look up the dynamic ranges of this layer once
+        dr = {
+            "input": init_dict[prefix + 'attention_self_query_input_amax'],
+            "fc_aout": init_dict[prefix + 'attention_output_add_local_input_quantizer_amax'],
+            "skln1": init_dict[prefix + 'intermediate_dense_input_amax'],
+            "gelu": init_dict[prefix + 'output_dense_input_amax'],
+            "fc_out": init_dict[prefix + 'output_add_local_input_quantizer_amax'],
+        }
+        assert (dr["input"] == init_dict[prefix + 'attention_self_key_input_amax'])
+        assert (dr["input"] == init_dict[prefix + 'attention_self_value_input_amax'])
+        input_tensor.set_dynamic_range(-dr["input"], dr["input"])
 
     context_transposed = attention_layer_opt(prefix + "attention_", config, init_dict, network, input_tensor, imask)
     attention_heads = context_transposed.get_output(0)
 
     # FC0
     B_aout = init_dict[prefix + B_AOUT]
+    W_aout = init_dict[prefix + W_AOUT]
     if config.use_int8:
-        W_aout = init_dict[prefix + W_AOUT]
         attention_out_fc = network.add_convolution(attention_heads, hidden_size, (1, 1), W_aout, B_aout)
         B_aout = None
 
@@ -311,18 +376,15 @@ def transformer_layer_opt(prefix, config, init_dict, network, input_tensor, imas
             attention_out_fc.set_output_type(0, trt.DataType.HALF if config.use_fp16 else trt.DataType.FLOAT)
 
         if config.use_qat:
-            dr_fc_aout = init_dict[prefix + 'attention_output_add_local_input_quantizer_amax']
-            set_output_range(attention_out_fc, dr_fc_aout)
+            set_output_range(attention_out_fc, dr["fc_aout"])
     else:
-        W_aoutT = init_dict[prefix + W_AOUT + "_notrans"]
-        attention_out_fc = custom_fc(config, network, attention_heads, hidden_size, W_aoutT)
+        attention_out_fc = custom_fc(config, network, attention_heads, hidden_size, W_aout)
 
     skiplayer = skipln(prefix + "attention_output_layernorm_", config, init_dict, network,
                        attention_out_fc.get_output(0), input_tensor, B_aout)
     attention_ln = skiplayer.get_output(0)
     if config.use_qat:
-        dr_skln1 = init_dict[prefix + 'intermediate_dense_input_amax']
-        set_output_range(skiplayer, dr_skln1)
+        set_output_range(skiplayer, dr["skln1"])
 
     # FC1 + GELU
     B_mid = init_dict[prefix + B_MID]
@@ -333,30 +395,13 @@ def transformer_layer_opt(prefix, config, init_dict, network, input_tensor, imas
         mid_dense = network.add_fully_connected(attention_ln, config.intermediate_size, W_mid, B_mid)
 
     mid_dense_out = mid_dense.get_output(0)
-    POW = network.add_constant((1, 1, 1, 1, 1), trt.Weights(np.ascontiguousarray([3.0], dtype=np.float32)))
-    MULTIPLY = network.add_constant((1, 1, 1, 1, 1), trt.Weights(np.ascontiguousarray([0.044715], dtype=np.float32)))
-    SQRT = network.add_constant((1, 1, 1, 1, 1), trt.Weights(
-        (np.ascontiguousarray([0.79788456080286535587989211986876], dtype=np.float32))))
-    ONE = network.add_constant((1, 1, 1, 1, 1), trt.Weights((np.ascontiguousarray([1.0], dtype=np.float32))))
-    HALF = network.add_constant((1, 1, 1, 1, 1), trt.Weights((np.ascontiguousarray([0.5], dtype=np.float32))))
-    X_pow = network.add_elementwise(mid_dense_out, POW.get_output(0), trt.ElementWiseOperation.POW)
-    X_pow_t = X_pow.get_output(0)
-    X_mul = network.add_elementwise(X_pow_t, MULTIPLY.get_output(0), trt.ElementWiseOperation.PROD)
-    X_add = network.add_elementwise(mid_dense_out, X_mul.get_output(0), trt.ElementWiseOperation.SUM)
-    X_sqrt = network.add_elementwise(X_add.get_output(0), SQRT.get_output(0), trt.ElementWiseOperation.PROD)
-    X_sqrt_tensor = X_sqrt.get_output(0)
-    X_tanh = network.add_activation(X_sqrt_tensor, trt.ActivationType.TANH)
-    X_tanh_tensor = X_tanh.get_output(0)
-    X_one = network.add_elementwise(X_tanh_tensor, ONE.get_output(0), trt.ElementWiseOperation.SUM)
-    CDF = network.add_elementwise(X_one.get_output(0), HALF.get_output(0), trt.ElementWiseOperation.PROD)
-    gelu_layer = network.add_elementwise(CDF.get_output(0), mid_dense_out, trt.ElementWiseOperation.PROD)
+    gelu_layer = add_gelu(config, network, mid_dense_out)
 
     intermediate_act = gelu_layer.get_output(0)
     set_tensor_name(intermediate_act, prefix, "gelu")
     if config.use_int8:
         if config.use_qat:
-            dr_gelu = init_dict[prefix + 'output_dense_input_amax']
-            set_output_range(gelu_layer, dr_gelu)
+            set_output_range(gelu_layer, dr["gelu"])
         else:
             # use gelu10 according to whitepaper http://arxiv.org/abs/2004.09602
             set_output_range(gelu_layer, 10)
@@ -364,20 +409,18 @@ def transformer_layer_opt(prefix, config, init_dict, network, input_tensor, imas
     # FC2
     # Dense to hidden size
     B_lout = init_dict[prefix + B_LOUT]
+    W_lout = init_dict[prefix + W_LOUT]
     if config.use_int8 and not config.use_fc2_gemm:
-        W_lout = init_dict[prefix + W_LOUT]
         out_dense = network.add_convolution(intermediate_act, hidden_size, (1, 1), W_lout, B_lout)
         B_lout = None
 
         if not config.use_int8_skipln:
             out_dense.set_output_type(0, trt.DataType.HALF if config.use_fp16 else trt.DataType.FLOAT)
     else:
-        W_loutT = init_dict[prefix + W_LOUT + "_notrans"]
-        out_dense = custom_fc(config, network, intermediate_act, hidden_size, W_loutT)
+        out_dense = custom_fc(config, network, intermediate_act, hidden_size, W_lout)
 
     if config.use_qat:
-        dr_fc_out = init_dict[prefix + 'output_add_local_input_quantizer_amax']
-        set_output_range(out_dense, dr_fc_out)
+        set_output_range(out_dense, dr["fc_out"])
     set_output_name(out_dense, prefix + "output_", "dense")
 
     out_layer = skipln(prefix + "output_layernorm_", config, init_dict, network, out_dense.get_output(0), attention_ln,
@@ -415,18 +458,41 @@ def squad_output(prefix, config, init_dict, network, input_tensor):
     W_out = init_dict[prefix + SQD_W]
     B_out = init_dict[prefix + SQD_B]
 
-    W = network.add_constant((1, hidden_size, 2), W_out)
-    dense = network.add_fully_connected(input_tensor, 2, W_out, B_out)
+    # W_out is stored as (2, hidden_size), matmul against it transposed instead of a 5-D fully connected layer
+    W = network.add_constant((1, 2, hidden_size), W_out)
+    B_const = network.add_constant((1, 1, 2), B_out)
+    flat_input = network.add_shuffle(input_tensor)
+    flat_input.reshape_dims = (0, 0, hidden_size)
+    mm = network.add_matrix_multiply(flat_input.get_output(0), trt.MatrixOperation.NONE,
+                                     W.get_output(0), trt.MatrixOperation.TRANSPOSE)
+    dense = network.add_elementwise(mm.get_output(0), B_const.get_output(0), trt.ElementWiseOperation.SUM)
 
+    # (S, B, 2) -> (S, B, 2, 1, 1) -> (B, S, 2, 1, 1)
     OUT = network.add_shuffle(dense.get_output(0))
+    OUT.reshape_dims = (0, 0, 2, 1, 1)
     OUT.second_transpose = (1, 0, 2, 3, 4)
     set_output_name(OUT, prefix, "squad_logits")
     return OUT
 
 
+def pack_qkv_weights(Wq, Wk, Wv, Bq, Bk, Bv, N, H):
+    """
+    Pack the query/key/value kernels and biases into the (N, 3, H, N, H) and (N, 3, H) layouts of the QKV2CTX plugin
+    """
+    # stacking on axis 1 writes the interleaved layout in a single pass, without a scratch buffer or transpose
+    Wall = np.ascontiguousarray(np.stack([Wq.reshape((N, H, N, H)),
+                                          Wk.reshape((N, H, N, H)),
+                                          Wv.reshape((N, H, N, H))], axis=1), dtype=np.float32)
+    Ball = np.ascontiguousarray(np.stack([Bq.reshape((N, H)),
+                                          Bk.reshape((N, H)),
+                                          Bv.reshape((N, H))], axis=1), dtype=np.float32)
+    return Wall, Ball
+
+
 def load_tf_weights(inputbase, config):
     """
     Load the weights from the tensorflow checkpoint
+    Not used by main(), the ensemble engines load the pytorch checkpoint through load_ensemble_weights
     """
     weights_dict = dict()
 
@@ -446,30 +512,32 @@ def load_tf_weights(inputbase, config):
 
         json.dump(output_info,
                   open('models/info.json', 'w'), ensure_ascii=False, indent=2)
+        verbose = TRT_LOGGER.min_severity == trt.Logger.VERBOSE
         for pn in param_names:
-            toks = pn.lower().split("/")
             if "encoder" in pn:
                 assert ("layer" in pn)
-                l = (re.findall("\d+", pn))[0]
-                outname = "l{}_".format(l) + "_".join(toks[3:])
+                l = _LAYER_RE.search(pn).group(0)
+                # drop the leading "bert/encoder/layer_<l>/" scope
+                outname = "l{}_".format(l) + pn.lower().split("/", 3)[3].replace("/", "_")
             else:
-                outname = "_".join(toks)
+                outname = pn.lower().replace("/", "_")
 
             tensor = reader.get_tensor(pn)
             shape = tensor.shape
             if pn.find("kernel") != -1:
-                weights_dict[outname + "_notrans"] = trt.Weights(np.ascontiguousarray(tensor).flatten())
-
-                TRT_LOGGER.log(TRT_LOGGER.VERBOSE, "Transposing {}\n".format(np))
+                if verbose:
+                    TRT_LOGGER.log(TRT_LOGGER.VERBOSE, "Transposing {}\n".format(np))
                 tensor = np.transpose(tensor)
 
             shape = tensor.shape
-            flat_tensor = tensor.flatten()
-            shape_str = "{} ".format(len(shape)) + " ".join([str(d) for d in shape])
+            # the transposed kernels are copied once here, everything else is a view
+            flat_tensor = tensor.ravel()
             weights_dict[outname] = trt.Weights(flat_tensor)
 
-            TRT_LOGGER.log(TRT_LOGGER.VERBOSE,
-                           "Original name: {:}, TensorRT name: {:}, shape: {:}".format(pn, outname, shape_str))
+            if verbose:
+                shape_str = "{} ".format(len(shape)) + " ".join([str(d) for d in shape])
+                TRT_LOGGER.log(TRT_LOGGER.VERBOSE,
+                               "Original name: {:}, TensorRT name: {:}, shape: {:}".format(pn, outname, shape_str))
 
         N = config.num_attention_heads
         H = config.head_size
@@ -478,36 +546,14 @@ def load_tf_weights(inputbase, config):
         for key, value in weights_dict.items():
             pos = key.find(BQ)
             if pos != -1:
-                hidden_size = value.size
                 prefix = key[:pos]
 
-                Bq_ = value
-                Bk_ = weights_dict[prefix + BK]
-                Bv_ = weights_dict[prefix + BV]
-                Wq_ = weights_dict[prefix + WQ]
-                Wk_ = weights_dict[prefix + WK]
-                Wv_ = weights_dict[prefix + WV]
-
-                mat_size = hidden_size * hidden_size
-                wcount = 3 * mat_size
-                Wall = np.zeros(wcount, np.float32)
-                bcount = 3 * hidden_size
-                Ball = np.zeros(bcount, np.float32)
-                Wall[0:mat_size] = Wq_.numpy()[0:mat_size]
-                Wall[mat_size:2 * mat_size] = Wk_.numpy()[0:mat_size]
-                Wall[2 * mat_size:3 * mat_size] = Wv_.numpy()[0:mat_size]
-                Ball[0:hidden_size] = Bq_.numpy()[0:hidden_size]
-                Ball[hidden_size:2 * hidden_size] = Bk_.numpy()[0:hidden_size]
-                Ball[2 * hidden_size:3 * hidden_size] = Bv_.numpy()[0:hidden_size]
-
-                Wall = np.ascontiguousarray(Wall.reshape((3, N, H, N, H)).transpose((1, 0, 2, 3, 4)), dtype=np.float32)
-                Ball = np.ascontiguousarray(Ball.reshape((3, N, H)).transpose((1, 0, 2)), dtype=np.float32)
+                Wall, Ball = pack_qkv_weights(*[weights_dict[prefix + name].numpy() for name in (WQ, WK, WV, BQ, BK, BV)],
+                                              N, H)
 
                 additional_dict[prefix + WQKV] = trt.Weights(Wall)
                 additional_dict[prefix + BQKV] = trt.Weights(Ball)
 
-                additional_dict[prefix + WQKV + "_notrans"] = trt.Weights(Wall.T)
-
     except Exception as error:
         TRT_LOGGER.log(TRT_LOGGER.ERROR, str(error))
 
@@ -523,7 +569,8 @@ def onnx_to_trt_name(onnx_name):
     Converting variables in the onnx checkpoint to names corresponding to the naming convention used in the TF version, expected by the builder
     """
     onnx_name = onnx_name.lower()
-    toks = [t.strip('_') for t in onnx_name.split('.')]
+    # quantizer tokens are underscore-prefixed, e.g. "query._weight_quantizer._amax"
+    toks = onnx_name.replace('._', '.').split('.')
     if toks[0] == 'bert':  # embeddings or encoder
         if toks[1] == 'encoder':  # transformer
 
@@ -557,18 +604,24 @@ def onnx_to_trt_name(onnx_name):
     return parsed
 
 
+def _as_weights(tensor):
+    """
+    Wrap tensor as flat FP32 trt.Weights, copying only if it is not already a contiguous FP32 buffer
+    """
+    return trt.Weights(np.ascontiguousarray(tensor, dtype=np.float32).ravel())
+
+
 def load_onnx_weights_and_quant(path, config):
     """
     Load the weights from the onnx checkpoint
     """
     N = config.num_attention_heads
     H = config.head_size
-    hidden_size = config.hidden_size
 
     model = onnx.load(path)
     weights = model.graph.initializer
-    tensor_dict = dict(
-        [(onnx_to_trt_name(w.name), np.frombuffer(w.raw_data, np.float32).reshape(w.dims)) for w in weights])
+    # to_array respects the initializer dtype, QAT exports may store FP16 weights
+    tensor_dict = {onnx_to_trt_name(w.name): numpy_helper.to_array(w) for w in weights}
 
     weights_dict = dict()
     for outname, tensor in tensor_dict.items():
@@ -577,33 +630,17 @@ def load_onnx_weights_and_quant(path, config):
         elif outname.find(BQ) != -1:
             prefix = outname[:outname.find(BQ)]
 
-            Wqkv = np.zeros((3, hidden_size, hidden_size), np.float32)
-            Bqkv = np.zeros((3, hidden_size), np.float32)
-
-            Wqkv[0, :, :] = tensor_dict[prefix + WQ]
-            Wqkv[1, :, :] = tensor_dict[prefix + WK]
-            Wqkv[2, :, :] = tensor_dict[prefix + WV]
-            Bqkv[0, :] = tensor
-            Bqkv[1, :] = tensor_dict[prefix + BK]
-            Bqkv[2, :] = tensor_dict[prefix + BV]
+            Wqkv, Bqkv = pack_qkv_weights(tensor_dict[prefix + WQ], tensor_dict[prefix + WK], tensor_dict[prefix + WV],
+                                          tensor, tensor_dict[prefix + BK], tensor_dict[prefix + BV], N, H)
 
-            Wqkv = np.ascontiguousarray(Wqkv.reshape((3, N, H, N, H)).transpose((1, 0, 2, 3, 4)))
-            Bqkv = np.ascontiguousarray(Bqkv.reshape((3, N, H)).transpose((1, 0, 2)))
-
-            weights_dict[prefix + WQKV] = trt.Weights(Wqkv)
-            weights_dict[prefix + BQKV] = trt.Weights(Bqkv)
-            weights_dict[prefix + WQKV + "_notrans"] = trt.Weights(Wqkv.T)
+            weights_dict[prefix + WQKV] = _as_weights(Wqkv)
+            weights_dict[prefix + BQKV] = _as_weights(Bqkv)
 
         elif outname.find(BK) != -1 or outname.find(BV) != -1 or outname.find(WQ) != -1 or outname.find(
             WK) != -1 or outname.find(WV) != -1:
             pass
         else:
-            flat_tensor = np.ascontiguousarray(tensor).flatten()
-            weights_dict[outname] = trt.Weights(flat_tensor)
-
-            if outname.find("kernel") != -1:
-                tensor = np.transpose(tensor)
-                weights_dict[outname + "_notrans"] = trt.Weights(np.ascontiguousarray(tensor).flatten())
+            weights_dict[outname] = _as_weights(tensor)
 
     TRT_LOGGER.log(TRT_LOGGER.INFO, "Found {:} entries in weight map".format(len(weights_dict)))
     return weights_dict
@@ -612,17 +649,19 @@ def load_onnx_weights_and_quant(path, config):
 def emb_layernorm(builder, network, config, weights_dict, builder_config, sequence_length, batch_sizes,
                   model_id=0):
     add_input = model_id==0
+    # the FP32 mask would only force a reformat in FP16/INT8 engines
+    use_mask_fp32 = not config.use_fp16 and not config.use_int8
     if len(batch_sizes) > 1:
         if add_input:
             input_ids = network.add_input(name="input_ids", dtype=trt.int32, shape=(sequence_length, -1))
             segment_ids = network.add_input(name="segment_ids", dtype=trt.int32, shape=(sequence_length, -1))
             input_mask = network.add_input(name="input_mask", dtype=trt.int32, shape=(sequence_length, -1))
-            input_mask_fp32 = network.add_input(name="input_mask_fp32", dtype=trt.float32, shape=(sequence_length, -1))
+            if use_mask_fp32:
+                network.add_input(name="input_mask_fp32", dtype=trt.float32, shape=(sequence_length, -1))
         else:
             input_ids = network.get_input(0)
             segment_ids = network.get_input(1)
             input_mask = network.get_input(2)
-            input_mask_fp32 = network.get_input(3)
 
         # Specify profiles for the batch sizes we're interested in.
         # Make sure the profile also works for all sizes not covered by the previous profile.
@@ -634,7 +673,8 @@ def emb_layernorm(builder, network, config, weights_dict, builder_config, sequen
             profile.set_shape("input_ids", min=min_shape, opt=shape, max=shape)
             profile.set_shape("segment_ids", min=min_shape, opt=shape, max=shape)
             profile.set_shape("input_mask", min=min_shape, opt=shape, max=shape)
-            profile.set_shape("input_mask_fp32", min=min_shape, opt=shape, max=shape)
+            if use_mask_fp32:
+                profile.set_shape("input_mask_fp32", min=min_shape, opt=shape, max=shape)
             builder_config.add_optimization_profile(profile)
             prev_size = batch_size
     else:
@@ -642,12 +682,13 @@ def emb_layernorm(builder, network, config, weights_dict, builder_config, sequen
             input_ids = network.add_input(name="input_ids", dtype=trt.int32, shape=(sequence_length, batch_sizes[0]))
             segment_ids = network.add_input(name="segment_ids", dtype=trt.int32, shape=(sequence_length, batch_sizes[0]))
             input_mask = network.add_input(name="input_mask", dtype=trt.int32, shape=(sequence_length, batch_sizes[0]))
-            input_mask_fp32 = network.add_input(name="input_mask_fp32", dtype=trt.float32, shape=(sequence_length, batch_sizes[0]))
+            if use_mask_fp32:
+                network.add_input(name="input_mask_fp32", dtype=trt.float32,
+                                  shape=(sequence_length, batch_sizes[0]))
         else:
             input_ids = network.get_input(0)
             segment_ids = network.get_input(1)
             input_mask = network.get_input(2)
-            input_mask_fp32 = network.get_input(3)
 
     wbeta = trt.PluginField("bert_embeddings_layernorm_beta", weights_dict["bert_embeddings_layernorm_beta"].numpy(),
                             trt.PluginFieldType.FLOAT32)
@@ -661,9 +702,8 @@ def emb_layernorm(builder, network, config, weights_dict, builder_config, sequen
     wposemb = trt.PluginField("bert_embeddings_position_embeddings",
                               weights_dict["bert_embeddings_position_embeddings"].numpy(), trt.PluginFieldType.FLOAT32)
 
-    output_fp16 = trt.PluginField("output_fp16", np.array([1 if config.use_fp16 else 0]).astype(np.int32),
-                                  trt.PluginFieldType.INT32)
-    mha_type = trt.PluginField("mha_type_id", np.array([get_mha_dtype(config)], np.int32), trt.PluginFieldType.INT32)
+    output_fp16 = get_int_plugin_field(config, "output_fp16", 1 if config.use_fp16 else 0)
+    mha_type = get_int_plugin_field(config, "mha_type_id", get_mha_dtype(config))
     pfc = trt.PluginFieldCollection([wbeta, wgamma, wwordemb, wtokemb, wposemb, output_fp16, mha_type])
     fn = emln_plg_creator.create_plugin("embeddings", pfc)
 
@@ -675,6 +715,50 @@ def emb_layernorm(builder, network, config, weights_dict, builder_config, sequen
     set_output_name(emb_layer, "embeddings_", "output")
     return emb_layer
 
+def calibration_cache_exists(calibrationCacheFile):
+    """
+    An empty cache file is left behind by an aborted calibration run and must be regenerated
+    """
+    return os.path.exists(calibrationCacheFile) and os.stat(calibrationCacheFile).st_size > 0
+
+class CacheCalibrator(trt.IInt8LegacyCalibrator):
+    """
+    Replays an existing calibration cache, so the calibration dataset is never loaded
+    """
+    def __init__(self, cache_file, batch_size=1):
+        trt.IInt8LegacyCalibrator.__init__(self)
+        self.cache_file = cache_file
+        self.batch_size = batch_size
+
+    def free(self):
+        pass
+
+    def get_batch_size(self):
+        return self.batch_size
+
+    def get_batch(self, names):
+        # TensorRT only asks for batches when the cache is rejected, there are none to give
+        return None
+
+    def read_calibration_cache(self):
+        with open(self.cache_file, "rb") as f:
+            return f.read()
+
+    def write_calibration_cache(self, cache):
+        pass
+
+    def get_quantile(self):
+        return 0.9999
+
+    def get_regression_cutoff(self):
+        return 1.0
+
+    def read_histogram_cache(self, length):
+        return None
+
+    def write_histogram_cache(self, ptr, length):
+        return None
+
 def generate_calibration_cache(sequence_length, workspace_size, config, weights_dict, squad_json, vocab_file,
                                calibrationCacheFile, calib_num):
     """
@@ -685,20 +769,21 @@ def generate_calibration_cache(sequence_length, workspace_size, config, weights_
     reused across different configurations.
     """
     # dynamic shape not working with calibration, so we need generate a calibration cache first using fulldims network
-    if not config.use_int8 or os.path.exists(calibrationCacheFile):
+    if not config.use_int8 or calibration_cache_exists(calibrationCacheFile):
         return calibrationCacheFile
 
     # generate calibration cache
     saved_use_fp16 = config.use_fp16
     config.use_fp16 = False
     config.is_calib_mode = True
-
-    with build_engine([1], workspace_size, sequence_length, config, weights_dict, squad_json, vocab_file,
-                      calibrationCacheFile, calib_num) as engine:
-        TRT_LOGGER.log(TRT_LOGGER.INFO, "calibration cache generated in {:}".format(calibrationCacheFile))
-
-    config.use_fp16 = saved_use_fp16
-    config.is_calib_mode = False
+    try:
+        with build_engine([1], workspace_size, sequence_length, config, weights_dict, squad_json, vocab_file,
+                          calibrationCacheFile, calib_num) as engine:
+            TRT_LOGGER.log(TRT_LOGGER.INFO, "calibration cache generated in {:}".format(calibrationCacheFile))
+    finally:
+        config.use_fp16 = saved_use_fp16
+        config.is_calib_mode = False
+    return calibrationCacheFile
 
 def load_configs(model_names, use_fp16,
                  use_int8, use_strict, use_fc2_gemm, use_int8_skipln, use_int8_multihead, use_qat):
@@ -720,71 +805,53 @@ def load_configs(model_names, use_fp16,
 
 def get_submodel_weights(tensor_dict, config):
     weights_dict = dict()
+    # flat numpy buffers behind weights_dict, read directly by the QKV packing
+    np_view = dict()
     try:
         # There might be training-related variables in the checkpoint that can be discarded
-        param_names = [key for key in sorted(tensor_dict)]
-        count = len(param_names)
+        # weights are keyed by name, the iteration order does not matter
+        count = len(tensor_dict)
         TRT_LOGGER.log(TRT_LOGGER.INFO, "Found {:} entries in weight map".format(count))
-        for pn in param_names:
-            toks = pn.lower().split("/")
+        # the per-weight log line is only formatted when it will be printed
+        verbose = TRT_LOGGER.min_severity == trt.Logger.VERBOSE
+        for pn in tensor_dict:
             if "encoder" in pn:
                 assert ("layer" in pn)
-                l = (re.findall("\d+", pn))[0]
-                outname = "l{}_".format(l) + "_".join(toks[3:])
+                l = _LAYER_RE.search(pn).group(0)
+                # drop the leading "bert/encoder/layer_<l>/" scope
+                outname = "l{}_".format(l) + pn.lower().split("/", 3)[3].replace("/", "_")
             else:
-                outname = "_".join(toks)
+                outname = pn.lower().replace("/", "_")
 
             tensor = tensor_dict[pn]
             shape = tensor.shape
-            if pn.find("kernel") != -1:
-                weights_dict[outname + "_notrans"] = trt.Weights(np.ascontiguousarray(tensor).flatten())
-
-                TRT_LOGGER.log(TRT_LOGGER.VERBOSE, "Transposing {}\n".format(np))
-                tensor = np.transpose(tensor)
-
-            shape = tensor.shape
-            flat_tensor = tensor.flatten()
-            shape_str = "{} ".format(len(shape)) + " ".join([str(d) for d in shape])
+            # a view of the loaded (contiguous) tensor, ravel only copies when it has to
+            flat_tensor = tensor.ravel()
             weights_dict[outname] = trt.Weights(flat_tensor)
+            np_view[outname] = flat_tensor
 
-            TRT_LOGGER.log(TRT_LOGGER.VERBOSE, "Original name: {:}, TensorRT name: {:}, shape: {:}".format(pn, outname, shape_str))
+            if verbose:
+                shape_str = "{} ".format(len(shape)) + " ".join([str(d) for d in shape])
+                TRT_LOGGER.log(TRT_LOGGER.VERBOSE, "Original name: {:}, TensorRT name: {:}, shape: {:}".format(pn, outname, shape_str))
 
         N = config.num_attention_heads
         H = config.head_size
 
         additional_dict = dict()
-        for key, value in weights_dict.items():
+        for key, value in np_view.items():
             pos = key.find(BQ)
             if pos != -1:
-                hidden_size = value.size
                 prefix = key[:pos]
 
-                Bq_ = value
-                Bk_ = weights_dict[prefix + BK]
-                Bv_ = weights_dict[prefix + BV]
-                Wq_ = weights_dict[prefix + WQ]
-                Wk_ = weights_dict[prefix + WK]
-                Wv_ = weights_dict[prefix + WV]
-
-                mat_size = hidden_size * hidden_size
-                wcount = 3 * mat_size
-                Wall = np.zeros(wcount, np.float32)
-                bcount = 3 * hidden_size
-                Ball = np.zeros(bcount, np.float32)
-                Wall[0:mat_size] = Wq_.numpy()[0:mat_size]
-                Wall[mat_size:2*mat_size] = Wk_.numpy()[0:mat_size]
-                Wall[2*mat_size:3*mat_size] = Wv_.numpy()[0:mat_size]
-                Ball[0:hidden_size] = Bq_.numpy()[0:hidden_size]
-                Ball[hidden_size:2*hidden_size] = Bk_.numpy()[0:hidden_size]
-                Ball[2*hidden_size:3*hidden_size] = Bv_.numpy()[0:hidden_size]
-
-                Wall = np.ascontiguousarray(Wall.reshape((3, N, H, N, H)).transpose((1, 0, 2, 3, 4)), dtype=np.float32)
-                Ball = np.ascontiguousarray(Ball.reshape((3, N, H)).transpose((1, 0, 2)), dtype=np.float32)
+                Wall, Ball = pack_qkv_weights(np_view[prefix + WQ], np_view[prefix + WK], np_view[prefix + WV],
+                                              value, np_view[prefix + BK], np_view[prefix + BV], N, H)
 
                 additional_dict[prefix + WQKV] = trt.Weights(Wall)
                 additional_dict[prefix + BQKV] = trt.Weights(Ball)
-
-                additional_dict[prefix + WQKV + "_notrans"] = trt.Weights(Wall.T)
+                # only the fused weights are read by the network, dropping the separate ones lets their
+                # checkpoint buffers be freed before the engine is built
+                for name in (WQ, WK, WV, BQ, BK, BV):
+                    del weights_dict[prefix + name]
 
     except Exception as error:
         TRT_LOGGER.log(TRT_LOGGER.ERROR, str(error))
@@ -794,22 +861,24 @@ def get_submodel_weights(tensor_dict, config):
 
 def get_classifier_weights(tensor_dict):
     weights_dict = dict()
-    param_names = [key for key in sorted(tensor_dict)]
-    for pn in param_names:
-        toks = pn.lower().split("/")
-        outname = "_".join(toks)
+    for pn in tensor_dict:
+        outname = pn.lower().replace("/", "_")
         tensor = tensor_dict[pn]
-        flat_tensor = tensor.flatten()
+        flat_tensor = tensor.ravel()
         weights_dict[outname] = trt.Weights(flat_tensor)
     return weights_dict
 
 def load_ensemble_weights(model_names, config_list):
     output_dict = get_tf_tensor_dict(model_names)
     output_weights_dict = {}
-    for model_id in range(len(config_list)):
-        output_weights_dict[str(model_id)] = get_submodel_weights(output_dict[str(model_id)],
-                                                                  config_list[model_id])
-        output_weights_dict[f'{model_id}_classifier'] = get_classifier_weights(output_dict[f'{model_id}_classifier'])
+    # sub-models are independent and the numpy packing releases the GIL
+    with ThreadPoolExecutor(max_workers=max(1, len(config_list))) as executor:
+        submodel_weights = executor.map(get_submodel_weights,
+                                        [output_dict[str(model_id)] for model_id in range(len(config_list))],
+                                        config_list)
+        for model_id, weights_dict in enumerate(submodel_weights):
+            output_weights_dict[str(model_id)] = weights_dict
+            output_weights_dict[f'{model_id}_classifier'] = get_classifier_weights(output_dict[f'{model_id}_classifier'])
     return output_weights_dict
 
 def pooler_layer(input_tensor, network, weights_dict):
@@ -887,7 +956,7 @@ def ensemble_score_output(score_list, network):
     return output_score_out
 
 def build_engine(batch_sizes, workspace_size, sequence_length, config_list, weights_dict, squad_json, vocab_file,
-                 calibrationCacheFile, calib_num):
+                 calibrationCacheFile, calib_num, reuse_calib=False):
     explicit_batch_flag = 1 << int(trt.NetworkDefinitionCreationFlag.EXPLICIT_BATCH)
     config = config_list[0]
     with trt.Builder(TRT_LOGGER) as builder, builder.create_network(
@@ -898,7 +967,10 @@ def build_engine(batch_sizes, workspace_size, sequence_length, config_list, weig
         if config.use_int8:
             builder_config.set_flag(trt.BuilderFlag.INT8)
             if not config.use_qat:
-                calibrator = BertCalibrator(squad_json, vocab_file, calibrationCacheFile, 1, sequence_length, calib_num)
+                if reuse_calib and calibration_cache_exists(calibrationCacheFile):
+                    calibrator = CacheCalibrator(calibrationCacheFile)
+                else:
+                    calibrator = BertCalibrator(squad_json, vocab_file, calibrationCacheFile, 1, sequence_length, calib_num)
                 builder_config.set_quantization_flag(trt.QuantizationFlag.CALIBRATE_BEFORE_FUSION)
                 builder_config.int8_calibrator = calibrator
         if config.use_strict:
@@ -959,7 +1031,10 @@ def main():
     parser.add_argument("-v", "--vocab-file", default="./pre-trained_model/uncased_L-24_H-1024_A-16/vocab.txt",
                         help="Path to file containing entire understandable vocab", required=False)
     parser.add_argument("-n", "--calib-num", default=100, help="calibration batch numbers", type=int)
-    parser.add_argument("-p", "--calib-path", help="calibration cache path", required=False)
+    parser.add_argument("-p", "--calib-path", default="calib_cache", help="calibration cache path", required=False)
+    parser.add_argument("-r", "--reuse-calib", action="store_true",
+                        help="Build from an existing calibration cache without loading the calibration dataset",
+                        required=False)
     parser.add_argument("-g", "--force-fc2-gemm", action="store_true", help="Force use gemm to implement FC2 layer",
                         required=False)
     parser.add_argument("-iln", "--force-int8-skipln", action="store_true",
@@ -971,7 +1046,7 @@ def main():
     args, _ = parser.parse_known_args()
     args.batch_size = args.batch_size or [1]
 
-    calib_cache = "calib_cache"
+    calib_cache = args.calib_path
 
     config_path = args.config_path
     TRT_LOGGER.log(TRT_LOGGER.INFO, "Using configuration file: {:}".format(config_path))
@@ -983,7 +1058,7 @@ def main():
                         args.force_int8_skipln, args.force_int8_multihead, args.int8 and args.onnx != None)
     weights_dict = load_ensemble_weights(model_names, config_list)
     with build_engine(args.batch_size, args.workspace_size, args.sequence_length, config_list, weights_dict, args.squad_json,
-                       args.vocab_file, calib_cache, args.calib_num) as engine:
+                       args.vocab_file, calib_cache, args.calib_num, args.reuse_calib) as engine:
         TRT_LOGGER.log(TRT_LOGGER.VERBOSE, "Serializing Engine...")
         serialized_engine = engine.serialize()
         TRT_LOGGER.log(TRT_LOGGER.INFO, "Saving Engine to {:}".format(args.output))